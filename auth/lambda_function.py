@@ -17,9 +17,39 @@ QUIZ_TABLE = "Oral-Arithmetic-Quiz"
 
 # 环境变量
 FRONT_END_URL = os.environ["FRONT_END_URL"]
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", 12))  # bcrypt 工作因子
+
+# 注册时 UID 冲突的最大尝试次数
+REGISTER_MAX_ATTEMPTS = 5
 
 # 初始化 DynamoDB 资源
 dynamodb = boto3.resource("dynamodb")
+client = dynamodb.meta.client  # 与资源共享类型转换，可直接使用 Python 原生类型
+
+
+def hash_password(password: str) -> str:
+    """
+    使用当前工作因子加密密码
+
+    bcrypt 计算时会释放 GIL，多请求宿主中各请求线程可并行加密，无需额外线程池
+
+    :param password: 密码
+    :return: 加密后的密码
+    """
+    hashed_password = bcrypt.hashpw(
+        password.encode("utf-8"), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
+    )
+    return hashed_password.decode("utf-8")
+
+
+def get_rounds(hashed_password: str) -> int:
+    """
+    获取已加密密码的工作因子
+
+    :param hashed_password: 加密后的密码，格式为 $2b$<rounds>$<salt+hash>
+    :return: 工作因子
+    """
+    return int(hashed_password.split("$")[2])
 
 
 def register(email: str, nickname: str, password: str) -> None:
@@ -29,7 +59,7 @@ def register(email: str, nickname: str, password: str) -> None:
     :param email: 邮箱
     :param nickname: 昵称
     :param password: 密码
-    :raise ValueError: 参数为空或邮箱已存在
+    :raise ValueError: 参数为空、邮箱已存在或 UID 多次冲突
     """
     # 检查参数是否为空
     if not email or not nickname or not password:
@@ -37,43 +67,67 @@ def register(email: str, nickname: str, password: str) -> None:
 
     # 定义数据表
     auth_table = dynamodb.Table(AUTH_TABLE)
-    user_table = dynamodb.Table(USER_TABLE)
 
-    # 检查邮箱是否存在
+    # 检查邮箱是否存在，避免为已注册邮箱计算 bcrypt
     if auth_table.get_item(Key={"email": email}).get("Item"):
         raise ValueError("邮箱已存在")
 
     # 对密码进行加密
-    hashed_password = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt())
+    hashed_password = hash_password(password)
 
-    # 生成 UID
-    while True:
+    # 生成 UID 并在同一事务中写入两张表，UID 冲突时重试
+    for _ in range(REGISTER_MAX_ATTEMPTS):
         uid = int(str(uuid.uuid4().int)[:8])
-        data = user_table.get_item(Key={"uid": uid})
-        if "Item" in data:
-            continue
-        else:
-            break
-
-    # 存入 DynamoDB
-    auth_item = {
-        "email": email,
-        "password": hashed_password.decode("utf-8"),
-        "uid": uid,
-    }
-    auth_table.put_item(Item=auth_item)
-    user_item = {
-        "uid": uid,
-        "email": email,
-        "nickname": nickname,
-        "avatar": "",
-        "total": 0,
-        "competition_total": 0,
-        "competition_win": 0,
-        "qid": [],
-        "mistake": [],
-    }
-    user_table.put_item(Item=user_item)
+        auth_item = {
+            "email": email,
+            "password": hashed_password,
+            "uid": uid,
+            "nickname": nickname,
+        }
+        user_item = {
+            "uid": uid,
+            "email": email,
+            "nickname": nickname,
+            "avatar": "",
+            "total": 0,
+            "competition_total": 0,
+            "competition_win": 0,
+            "qid": [],
+            "mistake": [],
+            "review_seeded": True,  # 新用户无需补充复习队列
+        }
+        try:
+            client.transact_write_items(
+                TransactItems=[
+                    {
+                        "Put": {
+                            "TableName": AUTH_TABLE,
+                            "Item": auth_item,
+                            "ConditionExpression": "attribute_not_exists(email)",
+                        }
+                    },
+                    {
+                        "Put": {
+                            "TableName": USER_TABLE,
+                            "Item": user_item,
+                            "ConditionExpression": "attribute_not_exists(uid)",
+                        }
+                    },
+                ]
+            )
+            return
+        except client.exceptions.TransactionCanceledException as e:
+            reasons = e.response.get("CancellationReasons", [])
+            codes = [reason.get("Code") for reason in reasons]
+            # 检查邮箱是否存在
+            if codes and codes[0] == "ConditionalCheckFailed":
+                raise ValueError("邮箱已存在")
+            # UID 已被占用，重新生成
+            if len(codes) > 1 and codes[1] == "ConditionalCheckFailed":
+                continue
+            raise
+
+    raise ValueError("注册失败，请重试")
 
 
 def login(email: str, password: str) -> [str, int]:
@@ -104,11 +158,26 @@ def login(email: str, password: str) -> [str, int]:
         raise ValueError("邮箱或密码错误")
 
     uid = auth_data.get("uid")
-
-    # 通过 UID 获取用户数据
-    user_data = user_table.get_item(Key={"uid": uid}).get("Item")
-
-    nickname = user_data.get("nickname")
+    nickname = auth_data.get("nickname")
+
+    # 旧数据未冗余昵称时，通过 UID 获取用户数据
+    if nickname is None:
+        user_data = user_table.get_item(Key={"uid": uid}).get("Item")
+        nickname = user_data.get("nickname")
+
+    # 工作因子变化或缺少昵称时，更新用户验证数据
+    rehash = get_rounds(auth_data["password"]) != BCRYPT_ROUNDS
+    if rehash or "nickname" not in auth_data:
+        auth_table.update_item(
+            Key={"email": email},
+            UpdateExpression="SET password = :password, nickname = :nickname",
+            ExpressionAttributeValues={
+                ":password": (
+                    hash_password(password) if rehash else auth_data["password"]
+                ),
+                ":nickname": nickname,
+            },
+        )
 
     # 通过 UID 与时间戳和随机数生成初始 session
     timestamp = int(time.time())
@@ -1,8 +1,12 @@
 import base64
+import hashlib
 import json
+import math
 import os
+import re
 import time
 import uuid
+from collections import OrderedDict
 
 import boto3
 
@@ -11,12 +15,40 @@ AUTH_TABLE = "Oral-Arithmetic-Auth"
 SESSION_TABLE = "Oral-Arithmetic-Session"
 USER_TABLE = "Oral-Arithmetic-User"
 QUIZ_TABLE = "Oral-Arithmetic-Quiz"
+IDEMPOTENCY_TABLE = "Oral-Arithmetic-Idempotency"
+REVIEW_TABLE = "Oral-Arithmetic-Review"
+STATS_TABLE = "Oral-Arithmetic-Stats"
+
+# 索引
+REVIEW_DUE_INDEX = "uid-due-index"  # REVIEW_TABLE 的本地二级索引，按到期时间排序
 
 # 环境变量
 FRONT_END_URL = os.environ["FRONT_END_URL"]
+ADMIN_UIDS = {
+    int(uid) for uid in os.environ.get("ADMIN_UIDS", "").split(",") if uid.strip()
+}  # 可查看全平台统计的 UID，以逗号分隔
 
 # 初始化 DynamoDB 资源
 dynamodb = boto3.resource("dynamodb")
+client = dynamodb.meta.client  # 与资源共享类型转换，可直接使用 Python 原生类型
+
+# 幂等结果的有效期与热容器内缓存
+IDEMPOTENCY_EXPIRATION = 86400  # 响应保存一天
+IDEMPOTENCY_LOCK_TIMEOUT = 30  # 处理中锁的租期，需大于 Lambda 超时时间
+IDEMPOTENCY_CACHE_SIZE = 256
+idempotency_cache = OrderedDict()
+
+# 错题复习间隔（秒）
+REVIEW_RETRY_DELAY = 600  # 答错后十分钟再复习
+REVIEW_INITIAL_INTERVAL = 86400  # 首次答对后一天再复习
+REVIEW_GRADUATE_INTERVAL = 2592000  # 间隔达到三十天后移出错题本
+REVIEW_QUEUE_LIMIT = 20
+REVIEW_QUEUE_MAX_LIMIT = 100
+review_seeded_uids = set()  # 热容器内已补充复习队列的用户
+
+# 用时分位数草图的相对误差，需与 stats 中的取值一致
+SKETCH_RELATIVE_ACCURACY = 0.02
+SKETCH_GAMMA = (1 + SKETCH_RELATIVE_ACCURACY) / (1 - SKETCH_RELATIVE_ACCURACY)
 
 
 def get_uid_from_cookie(cookie: dict) -> int:
@@ -48,6 +80,185 @@ def get_uid_from_cookie(cookie: dict) -> int:
         raise ValueError("Missing parameter")
 
 
+class IdempotencyConflictError(Exception):
+    """
+    相同幂等键的请求仍在处理中
+    """
+
+
+def get_idempotency(event: dict, event_type: str, uid: int, body: dict) -> dict:
+    """
+    获取幂等键
+
+    :param event: 事件
+    :param event_type: 事件类型
+    :param uid: 用户 ID
+    :param body: 请求体
+    :return: 按用户与事件类型区分的幂等键及请求体摘要，请求头无 Idempotency-Key 时为 None
+    """
+    headers = {k.lower(): v for k, v in (event.get("headers") or {}).items()}
+    idempotency_key = headers.get("idempotency-key")
+    if not idempotency_key:
+        return None
+
+    body_hash = hashlib.sha256(
+        json.dumps(body, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+    return {"key": f"{uid}:{event_type}:{idempotency_key}", "body_hash": body_hash}
+
+
+def claim_idempotency_key(idempotency: dict) -> dict:
+    """
+    占用幂等键
+
+    :param idempotency: 幂等键
+    :return: 已保存的响应，首次请求时为 None
+    :raise ValueError: 幂等键已用于不同的请求体
+    :raise IdempotencyConflictError: 相同幂等键的请求仍在处理中
+    """
+    if idempotency is None:
+        return None
+
+    key = idempotency["key"]
+    timestamp = int(time.time())
+
+    # 优先读取热容器内缓存
+    cached = idempotency_cache.get(key)
+    if cached:
+        expiration, body_hash, response = cached
+        if expiration >= timestamp:
+            idempotency_cache.move_to_end(key)
+            if body_hash != idempotency["body_hash"]:
+                raise ValueError("幂等键已用于其他请求")
+            return response
+        del idempotency_cache[key]
+
+    # 定义数据表
+    idempotency_table = dynamodb.Table(IDEMPOTENCY_TABLE)
+
+    # 以短租期锁占用幂等键，租期已过的锁和已过期的响应均可重新占用
+    try:
+        idempotency_table.put_item(
+            Item={
+                "idempotency_key": key,
+                "body_hash": idempotency["body_hash"],
+                "expiration": timestamp + IDEMPOTENCY_LOCK_TIMEOUT,
+            },
+            ConditionExpression="attribute_not_exists(idempotency_key) OR expiration < :now",
+            ExpressionAttributeValues={":now": timestamp},
+        )
+        return None
+    except client.exceptions.ConditionalCheckFailedException:
+        pass
+
+    # 返回已保存的响应
+    data = idempotency_table.get_item(Key={"idempotency_key": key}, ConsistentRead=True)
+    item = data.get("Item", {})
+    if item and item.get("body_hash") != idempotency["body_hash"]:
+        raise ValueError("幂等键已用于其他请求")
+    if "response" in item:
+        response = json.loads(item["response"])
+        cache_idempotent_response(idempotency, int(item["expiration"]), response)
+        return response
+    raise IdempotencyConflictError("请求处理中，请稍后重试")
+
+
+def get_idempotent_response_item(idempotency: dict, response: dict) -> list:
+    """
+    生成保存响应的事务项，与业务数据在同一事务中写入
+
+    :param idempotency: 幂等键
+    :param response: 响应
+    :return: 事务项列表，无幂等键时为空
+    """
+    if idempotency is None:
+        return []
+
+    return [
+        {
+            "Put": {
+                "TableName": IDEMPOTENCY_TABLE,
+                "Item": {
+                    "idempotency_key": idempotency["key"],
+                    "body_hash": idempotency["body_hash"],
+                    "expiration": int(time.time()) + IDEMPOTENCY_EXPIRATION,
+                    "response": json.dumps(response),
+                },
+                # 租期过后被其他请求重新占用时，只有一方能提交
+                "ConditionExpression": "attribute_not_exists(#response)",
+                "ExpressionAttributeNames": {"#response": "response"},
+            }
+        }
+    ]
+
+
+def release_idempotency_key(idempotency: dict) -> None:
+    """
+    释放处理中的幂等键，使失败的请求可以立即重试
+
+    :param idempotency: 幂等键
+    """
+    if idempotency is None:
+        return
+
+    # 定义数据表
+    idempotency_table = dynamodb.Table(IDEMPOTENCY_TABLE)
+
+    # 已保存响应的记录不删除
+    try:
+        idempotency_table.delete_item(
+            Key={"idempotency_key": idempotency["key"]},
+            ConditionExpression="attribute_not_exists(#response)",
+            ExpressionAttributeNames={"#response": "response"},
+        )
+    except client.exceptions.ConditionalCheckFailedException:
+        pass
+
+
+def cache_idempotent_response(
+    idempotency: dict, expiration: int, response: dict
+) -> None:
+    """
+    将响应写入热容器内缓存，超出容量时淘汰最久未使用的记录
+
+    :param idempotency: 幂等键
+    :param expiration: 过期时间
+    :param response: 响应
+    """
+    if idempotency is None:
+        return
+
+    key = idempotency["key"]
+    idempotency_cache[key] = (expiration, idempotency["body_hash"], response)
+    idempotency_cache.move_to_end(key)
+    while len(idempotency_cache) > IDEMPOTENCY_CACHE_SIZE:
+        idempotency_cache.popitem(last=False)
+
+
+def write_items(items: list, transact_items: list = None) -> None:
+    """
+    写入数据
+
+    带有随同写入的事务项（幂等响应）时在同一事务中写入，保证响应与业务数据一起提交；
+    否则逐条写入，事务写入消耗两倍的写入容量
+
+    :param items: 事务项格式的写入操作
+    :param transact_items: 随同写入的其他事务项
+    """
+    if transact_items:
+        client.transact_write_items(TransactItems=items + transact_items)
+        return
+
+    for item in items:
+        action, params = next(iter(item.items()))
+        params = dict(params)
+        table = dynamodb.Table(params.pop("TableName"))
+        if action == "Put":
+            table.put_item(**params)
+        else:
+            table.update_item(**params)
+
+
 def save_quiz(
     uid: int,
     mode: str,
@@ -58,6 +269,7 @@ def save_quiz(
     used_time: int,
     is_competition: bool,
     allow_competition: bool,
+    transact_items: list = None,
 ) -> None:
     """
     保存结果
@@ -71,6 +283,7 @@ def save_quiz(
     :param used_time: 用时
     :param is_competition: 是否为PK模式
     :param allow_competition: 是否允许发起PK
+    :param transact_items: 随同写入的其他事务项
     """
     # 检查参数是否为空
     if (
@@ -84,18 +297,8 @@ def save_quiz(
     ):
         raise ValueError("Missing parameter")
 
-    # 定义数据表
-    user_table = dynamodb.Table(USER_TABLE)
-    quiz_table = dynamodb.Table(QUIZ_TABLE)
-
     # 生成 QID
-    while True:
-        qid = str(uuid.uuid4())
-        data = quiz_table.get_item(Key={"qid": qid})
-        if "Item" in data:
-            continue
-        else:
-            break
+    qid = str(uuid.uuid4())
 
     # 存入 DynamoDB
     quiz_item = {
@@ -111,19 +314,41 @@ def save_quiz(
         "p1_uid": uid,
         "p2_uid": [],
     }
-    quiz_table.put_item(Item=quiz_item)
 
-    # 更新用户数据，将 qid 添加到 qid 列表中，并使总场数 +1
-    user_table.update_item(
-        Key={"uid": uid},
-        UpdateExpression="SET qid = list_append(if_not_exists(qid, :empty_list), :qid), #total = #total + :increment",
-        ExpressionAttributeNames={"#total": "total"},
-        ExpressionAttributeValues={":qid": [qid], ":empty_list": [], ":increment": 1},
+    # 写入测验，并更新用户数据：将 qid 添加到 qid 列表中，总场数 +1
+    write_items(
+        [
+            {
+                "Put": {
+                    "TableName": QUIZ_TABLE,
+                    "Item": quiz_item,
+                    "ConditionExpression": "attribute_not_exists(qid)",
+                }
+            },
+            {
+                "Update": {
+                    "TableName": USER_TABLE,
+                    "Key": {"uid": uid},
+                    "UpdateExpression": "SET qid = list_append(if_not_exists(qid, :empty_list), :qid), #total = #total + :increment",
+                    "ExpressionAttributeNames": {"#total": "total"},
+                    "ExpressionAttributeValues": {
+                        ":qid": [qid],
+                        ":empty_list": [],
+                        ":increment": 1,
+                    },
+                }
+            },
+        ],
+        transact_items,
     )
 
 
 def save_mistake(
-    uid: int, question: str, user_answer: int, correct_answer: int
+    uid: int,
+    question: str,
+    user_answer: int,
+    correct_answer: int,
+    transact_items: list = None,
 ) -> None:
     """
     保存错题
@@ -132,14 +357,12 @@ def save_mistake(
     :param question: 题目
     :param user_answer: 用户答案
     :param correct_answer: 正确答案
+    :param transact_items: 随同写入的其他事务项
     """
     # 检查参数是否为空
     if uid is None or not question or user_answer is None or correct_answer is None:
         raise ValueError("Missing parameter")
 
-    # 定义数据表
-    user_table = dynamodb.Table(USER_TABLE)
-
     # 错题记录
     mistake = {
         "question": question,
@@ -147,17 +370,40 @@ def save_mistake(
         "correctAnswer": correct_answer,
     }
 
-    # 更新用户数据，将错题添加到 mistake 列表中
-    user_table.update_item(
-        Key={"uid": uid},
-        UpdateExpression="SET mistake = list_append(if_not_exists(mistake, :empty_list), :mistake)",
-        ExpressionAttributeValues={":mistake": [mistake], ":empty_list": []},
+    # 加入复习队列（立即到期），并将错题添加到 mistake 列表中
+    # 逐条写入时先写复习队列：其写入可重复执行，追加错题失败后重试不会重复追加
+    write_items(
+        [
+            {
+                "Put": {
+                    "TableName": REVIEW_TABLE,
+                    "Item": {
+                        "uid": uid,
+                        **mistake,
+                        "interval": 0,
+                        "due": int(time.time()),
+                    },
+                }
+            },
+            {
+                "Update": {
+                    "TableName": USER_TABLE,
+                    "Key": {"uid": uid},
+                    "UpdateExpression": "SET mistake = list_append(if_not_exists(mistake, :empty_list), :mistake)",
+                    "ExpressionAttributeValues": {
+                        ":mistake": [mistake],
+                        ":empty_list": [],
+                    },
+                }
+            },
+        ],
+        transact_items,
     )
 
 
 def remove_mistake(uid: int, question: str) -> None:
     """
-    移除错题
+    移除错题（从错题本毕业）
 
     :param uid: 用户 ID
     :param question: 题目
@@ -168,6 +414,10 @@ def remove_mistake(uid: int, question: str) -> None:
 
     # 定义数据表
     user_table = dynamodb.Table(USER_TABLE)
+    review_table = dynamodb.Table(REVIEW_TABLE)
+
+    # 移出复习队列
+    review_table.delete_item(Key={"uid": uid, "question": question})
 
     # 获取用户数据
     response = user_table.get_item(Key={"uid": uid})
@@ -207,6 +457,217 @@ def get_mistakes(uid: int) -> list:
         raise ValueError("Missing parameter")
 
 
+def get_review_queue(uid: int, limit: int) -> list:
+    """
+    获取到期的复习错题
+
+    :param uid: 用户 ID
+    :param limit: 最多返回的题数
+    :return: 按到期时间排序的错题列表
+    """
+    # 检查参数是否为空
+    if uid is None:
+        raise ValueError("Missing parameter")
+
+    limit = min(max(int(limit), 1), REVIEW_QUEUE_MAX_LIMIT)
+
+    # 定义数据表
+    review_table = dynamodb.Table(REVIEW_TABLE)
+
+    # 加入复习队列之前保存的错题只需补充一次
+    if uid not in review_seeded_uids:
+        seed_review_queue(uid)
+        review_seeded_uids.add(uid)
+
+    # 通过索引只读取已到期的前 limit 道错题
+    response = review_table.query(
+        IndexName=REVIEW_DUE_INDEX,
+        KeyConditionExpression="#uid = :uid AND #due <= :now",
+        ExpressionAttributeNames={"#uid": "uid", "#due": "due"},
+        ExpressionAttributeValues={":uid": uid, ":now": int(time.time())},
+        Limit=limit,
+    )
+    return response.get("Items", [])
+
+
+def seed_review_queue(uid: int) -> None:
+    """
+    将尚无复习记录的旧错题加入复习队列，立即到期
+
+    每个用户只执行一次，完成后在用户数据中记录 review_seeded
+
+    :param uid: 用户 ID
+    """
+    # 定义数据表
+    user_table = dynamodb.Table(USER_TABLE)
+    review_table = dynamodb.Table(REVIEW_TABLE)
+
+    # 获取用户数据，只读取需要的字段
+    response = user_table.get_item(
+        Key={"uid": uid}, ProjectionExpression="mistake, review_seeded"
+    )
+    if "Item" not in response:
+        raise ValueError("Missing parameter")
+    if response["Item"].get("review_seeded"):
+        return
+
+    # 已有复习记录的错题保留其复习进度
+    timestamp = int(time.time())
+    for mistake in response["Item"].get("mistake", []):
+        try:
+            review_table.put_item(
+                Item={"uid": uid, **mistake, "interval": 0, "due": timestamp},
+                ConditionExpression="attribute_not_exists(question)",
+            )
+        except client.exceptions.ConditionalCheckFailedException:
+            continue
+
+    # 记录已补充
+    user_table.update_item(
+        Key={"uid": uid},
+        UpdateExpression="SET review_seeded = :seeded",
+        ExpressionAttributeValues={":seeded": True},
+    )
+
+
+def review_mistake(uid: int, question: str, correct: bool) -> None:
+    """
+    记录错题复习结果
+
+    答对时复习间隔翻倍，达到毕业间隔后移出错题本；答错时间隔清零并稍后重新复习
+
+    :param uid: 用户 ID
+    :param question: 题目
+    :param correct: 是否答对
+    """
+    # 检查参数是否为空
+    if uid is None or not question or correct is None:
+        raise ValueError("Missing parameter")
+    if not isinstance(correct, bool):
+        raise ValueError("参数错误")
+
+    # 定义数据表
+    review_table = dynamodb.Table(REVIEW_TABLE)
+
+    # 获取复习数据
+    response = review_table.get_item(Key={"uid": uid, "question": question})
+    if "Item" not in response:
+        raise ValueError("错题不存在")
+
+    # 计算下次复习时间
+    timestamp = int(time.time())
+    if correct:
+        interval = max(
+            int(response["Item"].get("interval", 0)) * 2, REVIEW_INITIAL_INTERVAL
+        )
+        if interval >= REVIEW_GRADUATE_INTERVAL:
+            remove_mistake(uid, question)
+            return
+        due = timestamp + interval
+    else:
+        interval = 0
+        due = timestamp + REVIEW_RETRY_DELAY
+
+    # 更新复习数据
+    review_table.update_item(
+        Key={"uid": uid, "question": question},
+        UpdateExpression="SET #interval = :interval, #due = :due",
+        ExpressionAttributeNames={"#interval": "interval", "#due": "due"},
+        ExpressionAttributeValues={":interval": interval, ":due": due},
+    )
+
+
+def get_quantile(rollup: dict, quantile: float) -> float:
+    """
+    通过草图估算用时分位数
+
+    :param rollup: 汇总数据
+    :param quantile: 分位数，取值 0 到 1
+    :return: 用时估计值，无数据时为 None
+    """
+    buckets = [(float("-inf"), int(rollup.get("used_time_zero", 0)))]
+    for name, count in rollup.items():
+        if name.startswith("used_time_") and name != "used_time_zero":
+            buckets.append((int(name[len("used_time_") :]), int(count)))
+    buckets.sort()
+
+    total = sum(count for _, count in buckets)
+    if total == 0:
+        return None
+
+    # 找到排名所在的桶，取桶的代表值
+    rank = quantile * (total - 1)
+    seen = 0
+    for index, count in buckets:
+        seen += count
+        if seen > rank:
+            if index == float("-inf"):
+                return 0
+            return 2 * math.pow(SKETCH_GAMMA, index) / (SKETCH_GAMMA + 1)
+
+
+def get_global_stats(uid: int, day: str) -> list:
+    """
+    获取全平台每日统计
+
+    :param uid: 用户 ID，需为管理员
+    :param day: 日期，格式为 YYYY-MM-DD（UTC）
+    :return: 各模式的测验数、正确率和用时中位数
+    :raise PermissionError: 用户不是管理员
+    """
+    # 检查参数是否为空
+    if uid is None or not day:
+        raise ValueError("Missing parameter")
+
+    # 检查权限
+    if uid not in ADMIN_UIDS:
+        raise PermissionError("无权限")
+
+    # 检查日期格式
+    try:
+        if not re.fullmatch(r"\d{4}-\d{2}-\d{2}", day):
+            raise ValueError
+        time.strptime(day, "%Y-%m-%d")
+    except ValueError:
+        raise ValueError("参数错误")
+
+    # 定义数据表
+    stats_table = dynamodb.Table(STATS_TABLE)
+
+    # 读取当日所有模式的汇总
+    items = []
+    kwargs = {
+        "KeyConditionExpression": "#day = :day",
+        "ExpressionAttributeNames": {"#day": "day"},
+        "ExpressionAttributeValues": {":day": day},
+    }
+    while True:
+        response = stats_table.query(**kwargs)
+        items.extend(response.get("Items", []))
+        if "LastEvaluatedKey" not in response:
+            break
+        kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    stats = []
+    for item in items:
+        question_count = int(item.get("question_count", 0))
+        correct_count = int(item.get("correct_count", 0))
+        stats.append(
+            {
+                "day": item["day"],
+                "mode": item["mode"],
+                "quizCount": int(item.get("quiz_count", 0)),
+                "questionCount": question_count,
+                "correctCount": correct_count,
+                "accuracy": (
+                    correct_count / question_count if question_count else None
+                ),
+                "medianUsedTime": get_quantile(item, 0.5),
+            }
+        )
+    return stats
+
+
 def lambda_handler(event, context):
     # 获取 HTTP 请求方法
     http_method = event["requestContext"]["http"]["method"]
@@ -218,7 +679,7 @@ def lambda_handler(event, context):
             "headers": {
                 "Access-Control-Allow-Origin": FRONT_END_URL,
                 "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
-                "Access-Control-Allow-Headers": "content-type",
+                "Access-Control-Allow-Headers": "content-type, idempotency-key",
                 "Access-Control-Allow-Credentials": True,
             },
             "body": "",
@@ -233,7 +694,7 @@ def lambda_handler(event, context):
             "headers": {
                 "Access-Control-Allow-Origin": FRONT_END_URL,
                 "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
-                "Access-Control-Allow-Headers": "content-type",
+                "Access-Control-Allow-Headers": "content-type, idempotency-key",
                 "Access-Control-Allow-Credentials": True,
             },
             "body": json.dumps({"message": "缺少参数"}),
@@ -254,35 +715,63 @@ def lambda_handler(event, context):
     if event_type == "save_quiz":
         try:
             uid = get_uid_from_cookie(event["cookies"])
-            mode = body.get("mode", None)
-            quiz_time = body.get("startTime", None)
-            questions = body.get("questions", None)
-            question_count = body.get("questionCount", None)
-            correct_count = body.get("correctCount", None)
-            used_time = body.get("elapsedTime", None)
-            is_competition = body.get("isCompetition", False)
-            allow_competition = body.get("allowCompetition", False)
-
-            save_quiz(
-                uid,
-                mode,
-                quiz_time,
-                questions,
-                question_count,
-                correct_count,
-                used_time,
-                is_competition,
-                allow_competition,
+            idempotency = get_idempotency(event, event_type, uid, body)
+            response = claim_idempotency_key(idempotency)
+            if response is not None:
+                return response
+
+            # 占用幂等键后的任何失败都释放幂等键，响应与业务数据在同一事务中保存
+            try:
+                if body is None:
+                    raise ValueError("Missing parameter")
+                mode = body.get("mode", None)
+                quiz_time = body.get("startTime", None)
+                questions = body.get("questions", None)
+                question_count = body.get("questionCount", None)
+                correct_count = body.get("correctCount", None)
+                used_time = body.get("elapsedTime", None)
+                is_competition = body.get("isCompetition", False)
+                allow_competition = body.get("allowCompetition", False)
+
+                response = {
+                    "statusCode": 201,
+                    "headers": {
+                        "Access-Control-Allow-Origin": FRONT_END_URL,
+                        "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+                        "Access-Control-Allow-Headers": "content-type, idempotency-key",
+                        "Access-Control-Allow-Credentials": True,
+                    },
+                    "body": json.dumps({"message": "Success"}),
+                }
+                save_quiz(
+                    uid,
+                    mode,
+                    quiz_time,
+                    questions,
+                    question_count,
+                    correct_count,
+                    used_time,
+                    is_competition,
+                    allow_competition,
+                    get_idempotent_response_item(idempotency, response),
+                )
+            except Exception:
+                release_idempotency_key(idempotency)
+                raise
+            cache_idempotent_response(
+                idempotency, int(time.time()) + IDEMPOTENCY_EXPIRATION, response
             )
+            return response
+        except IdempotencyConflictError as e:
             return {
-                "statusCode": 201,
+                "statusCode": 409,
                 "headers": {
                     "Access-Control-Allow-Origin": FRONT_END_URL,
                     "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
-                    "Access-Control-Allow-Headers": "content-type",
+                    "Access-Control-Allow-Headers": "content-type, idempotency-key",
                     "Access-Control-Allow-Credentials": True,
                 },
-                "body": json.dumps({"message": "Success"}),
+                "body": json.dumps({"message": str(e)}),
             }
         except ValueError as e:
             return {
@@ -290,7 +779,7 @@ def lambda_handler(event, context):
                 "headers": {
                     "Access-Control-Allow-Origin": FRONT_END_URL,
                     "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
-                    "Access-Control-Allow-Headers": "content-type",
+                    "Access-Control-Allow-Headers": "content-type, idempotency-key",
                     "Access-Control-Allow-Credentials": True,
                 },
                 "body": json.dumps({"message": str(e)}),
@@ -300,20 +789,53 @@ def lambda_handler(event, context):
     if event_type == "save_mistake":
         try:
             uid = get_uid_from_cookie(event["cookies"])
-            question = body.get("question", None)
-            user_answer = body.get("userAnswer", None)
-            correct_answer = body.get("correctAnswer", None)
-
-            save_mistake(uid, question, user_answer, correct_answer)
+            idempotency = get_idempotency(event, event_type, uid, body)
+            response = claim_idempotency_key(idempotency)
+            if response is not None:
+                return response
+
+            # 占用幂等键后的任何失败都释放幂等键，响应与业务数据在同一事务中保存
+            try:
+                if body is None:
+                    raise ValueError("Missing parameter")
+                question = body.get("question", None)
+                user_answer = body.get("userAnswer", None)
+                correct_answer = body.get("correctAnswer", None)
+
+                response = {
+                    "statusCode": 201,
+                    "headers": {
+                        "Access-Control-Allow-Origin": FRONT_END_URL,
+                        "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+                        "Access-Control-Allow-Headers": "content-type, idempotency-key",
+                        "Access-Control-Allow-Credentials": True,
+                    },
+                    "body": json.dumps({"message": "Success"}),
+                }
+                save_mistake(
+                    uid,
+                    question,
+                    user_answer,
+                    correct_answer,
+                    get_idempotent_response_item(idempotency, response),
+                )
+            except Exception:
+                release_idempotency_key(idempotency)
+                raise
+            cache_idempotent_response(
+                idempotency, int(time.time()) + IDEMPOTENCY_EXPIRATION, response
+            )
+            return response
+        except IdempotencyConflictError as e:
             return {
-                "statusCode": 201,
+                "statusCode": 409,
                 "headers": {
                     "Access-Control-Allow-Origin": FRONT_END_URL,
                     "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
-                    "Access-Control-Allow-Headers": "content-type",
+                    "Access-Control-Allow-Headers": "content-type, idempotency-key",
                     "Access-Control-Allow-Credentials": True,
                 },
-                "body": json.dumps({"message": "Success"}),
+                "body": json.dumps({"message": str(e)}),
             }
         except ValueError as e:
             return {
@@ -321,7 +843,7 @@ def lambda_handler(event, context):
                 "headers": {
                     "Access-Control-Allow-Origin": FRONT_END_URL,
                     "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
-                    "Access-Control-Allow-Headers": "content-type",
+                    "Access-Control-Allow-Headers": "content-type, idempotency-key",
                     "Access-Control-Allow-Credentials": True,
                 },
                 "body": json.dumps({"message": str(e)}),
@@ -337,7 +859,35 @@ def lambda_handler(event, context):
                 "headers": {
                     "Access-Control-Allow-Origin": FRONT_END_URL,
                     "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
-                    "Access-Control-Allow-Headers": "content-type",
+                    "Access-Control-Allow-Headers": "content-type, idempotency-key",
+                    "Access-Control-Allow-Credentials": True,
+                },
+                "body": json.dumps(mistakes, default=str),
+            }
+        except ValueError as e:
+            return {
+                "statusCode": 400,
+                "headers": {
+                    "Access-Control-Allow-Origin": FRONT_END_URL,
+                    "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+                    "Access-Control-Allow-Headers": "content-type, idempotency-key",
+                    "Access-Control-Allow-Credentials": True,
+                },
+                "body": json.dumps({"message": str(e)}),
+            }
+
+    # 获取复习队列
+    if event_type == "review_queue":
+        try:
+            uid = get_uid_from_cookie(event["cookies"])
+            limit = event["queryStringParameters"].get("limit", REVIEW_QUEUE_LIMIT)
+            mistakes = get_review_queue(uid, limit)
+            return {
+                "statusCode": 200,
+                "headers": {
+                    "Access-Control-Allow-Origin": FRONT_END_URL,
+                    "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+                    "Access-Control-Allow-Headers": "content-type, idempotency-key",
                     "Access-Control-Allow-Credentials": True,
                 },
                 "body": json.dumps(mistakes, default=str),
@@ -348,7 +898,78 @@ def lambda_handler(event, context):
                 "headers": {
                     "Access-Control-Allow-Origin": FRONT_END_URL,
                     "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
-                    "Access-Control-Allow-Headers": "content-type",
+                    "Access-Control-Allow-Headers": "content-type, idempotency-key",
+                    "Access-Control-Allow-Credentials": True,
+                },
+                "body": json.dumps({"message": str(e)}),
+            }
+
+    # 记录复习结果
+    if event_type == "review_mistake":
+        try:
+            uid = get_uid_from_cookie(event["cookies"])
+            question = body.get("question", None)
+            correct = body.get("correct", None)
+
+            review_mistake(uid, question, correct)
+            return {
+                "statusCode": 201,
+                "headers": {
+                    "Access-Control-Allow-Origin": FRONT_END_URL,
+                    "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+                    "Access-Control-Allow-Headers": "content-type, idempotency-key",
+                    "Access-Control-Allow-Credentials": True,
+                },
+                "body": json.dumps({"message": "Success"}),
+            }
+        except ValueError as e:
+            return {
+                "statusCode": 400,
+                "headers": {
+                    "Access-Control-Allow-Origin": FRONT_END_URL,
+                    "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+                    "Access-Control-Allow-Headers": "content-type, idempotency-key",
+                    "Access-Control-Allow-Credentials": True,
+                },
+                "body": json.dumps({"message": str(e)}),
+            }
+
+    # 获取全平台统计
+    if event_type == "global_stats":
+        try:
+            uid = get_uid_from_cookie(event["cookies"])
+            day = event["queryStringParameters"].get(
+                "day", time.strftime("%Y-%m-%d", time.gmtime())
+            )
+            stats = get_global_stats(uid, day)
+            return {
+                "statusCode": 200,
+                "headers": {
+                    "Access-Control-Allow-Origin": FRONT_END_URL,
+                    "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+                    "Access-Control-Allow-Headers": "content-type, idempotency-key",
+                    "Access-Control-Allow-Credentials": True,
+                },
+                "body": json.dumps(stats),
+            }
+        except PermissionError as e:
+            return {
+                "statusCode": 403,
+                "headers": {
+                    "Access-Control-Allow-Origin": FRONT_END_URL,
+                    "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+                    "Access-Control-Allow-Headers": "content-type, idempotency-key",
+                    "Access-Control-Allow-Credentials": True,
+                },
+                "body": json.dumps({"message": str(e)}),
+            }
+        except ValueError as e:
+            return {
+                "statusCode": 400,
+                "headers": {
+                    "Access-Control-Allow-Origin": FRONT_END_URL,
+                    "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+                    "Access-Control-Allow-Headers": "content-type, idempotency-key",
                     "Access-Control-Allow-Credentials": True,
                 },
                 "body": json.dumps({"message": str(e)}),
@@ -366,7 +987,7 @@ def lambda_handler(event, context):
                 "headers": {
                     "Access-Control-Allow-Origin": FRONT_END_URL,
                     "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
-                    "Access-Control-Allow-Headers": "content-type",
+                    "Access-Control-Allow-Headers": "content-type, idempotency-key",
                     "Access-Control-Allow-Credentials": True,
                 },
                 "body": json.dumps({"message": "Success"}),
@@ -377,7 +998,7 @@ def lambda_handler(event, context):
                 "headers": {
                     "Access-Control-Allow-Origin": FRONT_END_URL,
                     "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
-                    "Access-Control-Allow-Headers": "content-type",
+                    "Access-Control-Allow-Headers": "content-type, idempotency-key",
                     "Access-Control-Allow-Credentials": True,
                 },
                 "body": json.dumps({"message": str(e)}),
@@ -388,7 +1009,7 @@ def lambda_handler(event, context):
         "headers": {
             "Access-Control-Allow-Origin": FRONT_END_URL,
             "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
-            "Access-Control-Allow-Headers": "content-type",
+            "Access-Control-Allow-Headers": "content-type, idempotency-key",
             "Access-Control-Allow-Credentials": True,
         },
         "body": ({"message": "参数错误"}),
@@ -0,0 +1,139 @@
+import hashlib
+import math
+import time
+
+import boto3
+from boto3.dynamodb.types import TypeDeserializer
+
+# 数据表
+QUIZ_TABLE = "Oral-Arithmetic-Quiz"
+STATS_TABLE = "Oral-Arithmetic-Stats"
+STATS_BATCH_TABLE = "Oral-Arithmetic-Stats-Batch"
+
+# 批次标记的有效期，需长于流记录的保留时间（24 小时）
+BATCH_EXPIRATION = 172800  # 两天
+
+# 用时分位数草图的相对误差，需与 quiz 中的取值一致
+SKETCH_RELATIVE_ACCURACY = 0.02
+SKETCH_GAMMA = (1 + SKETCH_RELATIVE_ACCURACY) / (1 - SKETCH_RELATIVE_ACCURACY)
+
+# 初始化 DynamoDB 资源
+dynamodb = boto3.resource("dynamodb")
+client = dynamodb.meta.client  # 与资源共享类型转换，可直接使用 Python 原生类型
+deserializer = TypeDeserializer()
+
+
+def get_sketch_key(used_time: float) -> str:
+    """
+    获取用时所在的草图桶
+
+    :param used_time: 用时
+    :return: 桶对应的属性名，非正数用时归入 used_time_zero
+    """
+    if used_time <= 0:
+        return "used_time_zero"
+    return f"used_time_{math.ceil(math.log(used_time, SKETCH_GAMMA))}"
+
+
+def fold(rollups: dict, quiz: dict, timestamp: int, sequence_number: str) -> None:
+    """
+    将一条测验记录合并到汇总中
+
+    :param rollups: 以 (日期, 模式) 为键的汇总
+    :param quiz: 测验记录
+    :param timestamp: 记录写入时间
+    :param sequence_number: 流记录序列号
+    """
+    day = time.strftime("%Y-%m-%d", time.gmtime(timestamp))
+    mode = str(quiz.get("mode"))
+    rollup = rollups.setdefault((day, mode), {"counters": {}, "sequence_numbers": []})
+
+    counters = {
+        "quiz_count": 1,
+        "question_count": int(quiz.get("question_count") or 0),
+        "correct_count": int(quiz.get("correct_count") or 0),
+    }
+    used_time = quiz.get("used_time")
+    if used_time is not None:
+        counters[get_sketch_key(float(used_time))] = 1
+
+    for name, value in counters.items():
+        rollup["counters"][name] = rollup["counters"].get(name, 0) + value
+    rollup["sequence_numbers"].append(sequence_number)
+
+
+def save_rollups(rollups: dict) -> None:
+    """
+    使用原子计数器写入汇总
+
+    每个汇总以参与合并的流记录序列号生成批次标记，与计数器在同一事务中写入
+    STATS_BATCH_TABLE（TTL 自动删除）；已写入过的批次再次到达时条件检查失败并跳过，
+    批次整体重试不会重复计数，汇总数据的大小也不会随批次数增长
+
+    :param rollups: 以 (日期, 模式) 为键的汇总
+    """
+    expiration = int(time.time()) + BATCH_EXPIRATION
+
+    for (day, mode), rollup in rollups.items():
+        counters = rollup["counters"]
+        batch = hashlib.sha256(
+            ",".join([day, mode, *rollup["sequence_numbers"]]).encode("utf-8")
+        ).hexdigest()
+
+        names = {f"#c{i}": name for i, name in enumerate(counters)}
+        values = {f":c{i}": value for i, value in enumerate(counters.values())}
+        try:
+            client.transact_write_items(
+                TransactItems=[
+                    {
+                        "Put": {
+                            "TableName": STATS_BATCH_TABLE,
+                            "Item": {"batch": batch, "expiration": expiration},
+                            "ConditionExpression": "attribute_not_exists(#batch)",
+                            "ExpressionAttributeNames": {"#batch": "batch"},
+                        }
+                    },
+                    {
+                        "Update": {
+                            "TableName": STATS_TABLE,
+                            "Key": {"day": day, "mode": mode},
+                            # 同时移除旧版本写入的 applied_batches
+                            "UpdateExpression": "ADD "
+                            + ", ".join(f"#c{i} :c{i}" for i in range(len(counters)))
+                            + " REMOVE applied_batches",
+                            "ExpressionAttributeNames": names,
+                            "ExpressionAttributeValues": values,
+                        }
+                    },
+                ]
+            )
+        except client.exceptions.TransactionCanceledException as e:
+            reasons = e.response.get("CancellationReasons", [])
+            # 该批次已写入
+            if reasons and reasons[0].get("Code") == "ConditionalCheckFailed":
+                continue
+            raise
+
+
+def lambda_handler(event, context):
+    # 同一批次内先在内存中合并，每个 (日期, 模式) 只写一次
+    # 批次标记依赖重试时批次内容不变，事件源映射不要开启 BisectBatchOnFunctionError
+    rollups = {}
+    for record in event.get("Records", []):
+        # 只统计新增的测验，PK 等后续修改不重复计数
+        if record.get("eventName") != "INSERT":
+            continue
+
+        image = record["dynamodb"].get("NewImage")
+        if not image:
+            continue
+
+        quiz = {k: deserializer.deserialize(v) for k, v in image.items()}
+        timestamp = int(
+            record["dynamodb"].get("ApproximateCreationDateTime", time.time())
+        )
+        fold(rollups, quiz, timestamp, record["dynamodb"]["SequenceNumber"])
+
+    save_rollups(rollups)
+
+    return {"processed": sum(r["counters"]["quiz_count"] for r in rollups.values())}
@@ -1,8 +1,14 @@
+import argparse
 import base64
+import gzip
+import itertools
 import json
 import os
+import sys
+import tempfile
 import time
 import uuid
+from decimal import Decimal
 
 import boto3
 
@@ -13,7 +19,16 @@ USER_TABLE = "Oral-Arithmetic-User"
 QUIZ_TABLE = "Oral-Arithmetic-Quiz"
 
 # 环境变量
-FRONT_END_URL = os.environ["FRONT_END_URL"]
+FRONT_END_URL = os.environ.get("FRONT_END_URL")  # 命令行导出时无需设置
+EXPORT_BUCKET = os.environ.get("EXPORT_BUCKET")  # 未配置时直接在响应中返回导出数据
+
+# 导出配置
+EXPORT_BATCH_SIZE = 100  # BatchGetItem 单次最多读取 100 条
+EXPORT_URL_EXPIRATION = 3600  # 下载链接有效期一小时
+EXPORT_MAX_RETRIES = 5  # 未处理键的最大重试次数
+EXPORT_RETRY_DELAY = 0.05  # 首次重试等待秒数，之后指数增长
+# 直接返回的上限，base64 后需小于 Lambda 6 MB 响应限制
+EXPORT_INLINE_MAX_SIZE = 4 * 1024 * 1024
 
 # 初始化 DynamoDB 资源
 dynamodb = boto3.resource("dynamodb")
@@ -72,6 +87,114 @@ def get(uid: int) -> dict:
         raise ValueError("Missing parameter")
 
 
+def to_json(value):
+    """
+    将 DynamoDB 数值转换为 JSON 可序列化的类型
+
+    :param value: 值
+    :return: 转换后的值
+    """
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return str(value)
+
+
+def iter_quizzes(qids: list):
+    """
+    分批读取测验记录
+
+    :param qids: 测验 ID 列表
+    :return: 按 qids 顺序逐条产出测验记录的生成器
+    """
+    for i in range(0, len(qids), EXPORT_BATCH_SIZE):
+        batch = qids[i : i + EXPORT_BATCH_SIZE]
+        request = {QUIZ_TABLE: {"Keys": [{"qid": qid} for qid in batch]}}
+        quizzes = {}
+        attempt = 0
+        while True:
+            response = dynamodb.batch_get_item(RequestItems=request)
+            for quiz in response.get("Responses", {}).get(QUIZ_TABLE, []):
+                quizzes[quiz["qid"]] = quiz
+
+            # 以指数退避重试未处理的键
+            request = response.get("UnprocessedKeys")
+            if not request:
+                break
+            if attempt >= EXPORT_MAX_RETRIES:
+                raise RuntimeError("读取测验记录失败")
+            time.sleep(EXPORT_RETRY_DELAY * 2**attempt)
+            attempt += 1
+
+        # BatchGetItem 返回顺序不固定，按 qids 顺序产出
+        for qid in batch:
+            if qid in quizzes:
+                yield quizzes[qid]
+
+
+def iter_export_records(uid: int):
+    """
+    产出用户的全部历史记录
+
+    :param uid: UID
+    :return: 依次产出用户资料、测验和错题的生成器
+    """
+    # 检查参数是否为空
+    if uid is None:
+        raise ValueError("Missing parameter")
+
+    # 定义数据表
+    user_table = dynamodb.Table(USER_TABLE)
+
+    # 读取 DynamoDB
+    data = user_table.get_item(Key={"uid": uid})
+    if "Item" not in data:
+        raise ValueError("Missing parameter")
+
+    userdata = data["Item"]
+    qids = userdata.pop("qid", [])
+    mistakes = userdata.pop("mistake", [])
+
+    yield {"type": "user", **userdata}
+    for quiz in iter_quizzes(qids):
+        yield {"type": "quiz", **quiz}
+    for mistake in mistakes:
+        yield {"type": "mistake", **mistake}
+
+
+def iter_ndjson(records):
+    """
+    将记录编码为 NDJSON
+
+    :param records: 记录生成器
+    :return: 逐行产出 UTF-8 编码 NDJSON 的生成器
+    """
+    for record in records:
+        yield (json.dumps(record, ensure_ascii=False, default=to_json) + "\n").encode(
+            "utf-8"
+        )
+
+
+def export(uid: int, fileobj, compress: bool = True) -> None:
+    """
+    导出用户的全部历史记录
+
+    :param uid: UID
+    :param fileobj: 以二进制方式打开的输出文件
+    :param compress: 是否使用 gzip 压缩
+    """
+    # 先取出第一条记录，用户不存在时不写入任何内容
+    records = iter_export_records(uid)
+    lines = iter_ndjson(itertools.chain([next(records)], records))
+
+    output = gzip.GzipFile(fileobj=fileobj, mode="wb") if compress else fileobj
+    try:
+        for line in lines:
+            output.write(line)
+    finally:
+        if compress:
+            output.close()
+
+
 def lambda_handler(event, context):
     # 获取 HTTP 请求方法
     http_method = event["requestContext"]["http"]["method"]
@@ -142,6 +265,68 @@ def lambda_handler(event, context):
                 "body": json.dumps({"message": str(e)}),
             }
 
+    # 导出历史记录
+    if event_type == "export":
+        try:
+            uid = get_uid_from_cookie(event["cookies"])
+            with tempfile.TemporaryFile() as fileobj:
+                export(uid, fileobj)
+                fileobj.seek(0)
+
+                # 上传至 S3 并返回下载链接
+                if EXPORT_BUCKET:
+                    s3 = boto3.client("s3")
+                    key = f"export/{uid}/{uuid.uuid4()}.ndjson.gz"
+                    s3.upload_fileobj(fileobj, EXPORT_BUCKET, key)
+                    url = s3.generate_presigned_url(
+                        "get_object",
+                        Params={"Bucket": EXPORT_BUCKET, "Key": key},
+                        ExpiresIn=EXPORT_URL_EXPIRATION,
+                    )
+                    return {
+                        "statusCode": 201,
+                        "headers": {
+                            "Access-Control-Allow-Origin": FRONT_END_URL,
+                            "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+                            "Access-Control-Allow-Headers": "content-type",
+                            "Access-Control-Allow-Credentials": True,
+                        },
+                        "body": json.dumps(
+                            {"url": url, "expiration": EXPORT_URL_EXPIRATION}
+                        ),
+                    }
+
+                # 未配置 EXPORT_BUCKET 时只直接返回较小的导出数据
+                size = fileobj.seek(0, os.SEEK_END)
+                if size > EXPORT_INLINE_MAX_SIZE:
+                    raise ValueError("导出数据过大，请联系管理员")
+                fileobj.seek(0)
+
+                return {
+                    "statusCode": 200,
+                    "headers": {
+                        "Access-Control-Allow-Origin": FRONT_END_URL,
+                        "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+                        "Access-Control-Allow-Headers": "content-type",
+                        "Access-Control-Allow-Credentials": True,
+                        "Content-Type": "application/gzip",
+                        "Content-Disposition": f'attachment; filename="{uid}.ndjson.gz"',
+                    },
+                    "isBase64Encoded": True,
+                    "body": base64.b64encode(fileobj.read()).decode("utf-8"),
+                }
+        except ValueError as e:
+            return {
+                "statusCode": 400,
+                "headers": {
+                    "Access-Control-Allow-Origin": FRONT_END_URL,
+                    "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+                    "Access-Control-Allow-Headers": "content-type",
+                    "Access-Control-Allow-Credentials": True,
+                },
+                "body": json.dumps({"message": str(e)}),
+            }
+
     return {
         "statusCode": 400,
         "headers": {
@@ -152,3 +337,21 @@ def lambda_handler(event, context):
         },
         "body": ({"message": "参数错误"}),
     }
+
+
+if __name__ == "__main__":
+    # 命令行导出：python lambda_function.py <uid> [-o 输出文件]
+    parser = argparse.ArgumentParser(description="导出用户的全部历史记录")
+    parser.add_argument("uid", type=int, help="UID")
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="输出文件，以 .gz 结尾时使用 gzip 压缩，默认输出到标准输出",
+    )
+    args = parser.parse_args()
+
+    if args.output:
+        with open(args.output, "wb") as f:
+            export(args.uid, f, compress=args.output.endswith(".gz"))
+    else:
+        export(args.uid, sys.stdout.buffer, compress=False)